@@ -9,11 +9,13 @@ Original file is located at
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 from skimage.filters import threshold_otsu
 
-def readcsv(file: str, header: bool = False, separator: str = ';') -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+def readcsv(file: str, header: bool = False, separator: str = ';', chunksize: int | None = None,
+            memmap: str | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
     Gets the wavenumbers and intensity from a .csv file.
 
@@ -22,6 +24,12 @@ def readcsv(file: str, header: bool = False, separator: str = ';') -> tuple[np.n
         header (bool, optional): If True, the headers in the .csv file - which are in the first
             columns - are read and exported. Defaults to False.
         separator (str, optional): Separator between values, can be ';', ',', ':', or '.'. Defaults to ';'.
+            The decimal mark, ',' or '.', is taken from the wavenumbers in the header row. Values may be enclosed
+            in single quotes, but apostrophes inside a value (e.g. as thousands separators) are not accepted.
+        chunksize (int, optional): If given, the file is parsed this many measurements at a time and written into
+            a preallocated array, so large files never need a full parsed copy in memory. Defaults to None.
+        memmap (str, optional): Path of a file to back the intensities with a np.memmap instead of RAM;
+            implies chunked reading, with 4096 measurements per chunk if chunksize is not given. Defaults to None.
 
     Returns:
         tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: A tuple containing:
@@ -31,33 +39,65 @@ def readcsv(file: str, header: bool = False, separator: str = ';') -> tuple[np.n
             - headLabels (optional) (np.ndarray): Array of labels corresponding to the titles of the header columns.
             - headColumns (optional) (np.ndarray): Array of heading information corresponding to each measurement.
     """
-    # Read the file and extract the header row and data lines
+    # Read the header row to find where the wavenumber columns start
     with open(file, 'r') as f:
-        headRow = f.readline().replace("'", "").replace(",", ".")
-        headRowArray = headRow.split(separator)
+        rawHeadRow = f.readline()
+    headRow = rawHeadRow.replace("'", "").replace(",", ".")
+    headRowArray = headRow.split(separator)
 
-        # Find the starting column index of the wavenumbers
-        startcol = next((i for i, v in enumerate(headRowArray) if is_float(v)), 0)
+    # Find the starting column index of the wavenumbers
+    startcol = next((i for i, v in enumerate(headRowArray) if is_float(v)), 0)
 
-        # Extract the wavenumbers and header labels
-        wavenumbers = np.array([float(x) for x in headRowArray[startcol:]])
-        headLabels = np.array([label[5:] if label.startswith('META:') else label for label in headRowArray[:startcol]])
+    # Extract the wavenumbers and header labels
+    wavenumbers = np.array([float(x) for x in headRowArray[startcol:]])
+    headLabels = np.array([label[5:] if label.startswith('META:') else label for label in headRowArray[:startcol]])
 
-        # Read the data lines and store the intensities
-        lines = f.readlines()
-        nMeasurements = len(lines)
-        nFeatures = len(wavenumbers)
+    nFeatures = len(wavenumbers)
 
-        intensities = np.zeros((nMeasurements, nFeatures))
-        headColumns = np.zeros((0, startcol))
+    # Use the decimal mark the file writes its wavenumbers with
+    rawWavenumbers = rawHeadRow.split(separator)[startcol:]
+    decimal = ',' if separator != ',' and any(',' in x for x in rawWavenumbers) else '.'
 
-        for i, line in enumerate(lines):
-            elements = line.replace("'", "").replace(",", ".").split(separator)
-            headColumns = np.vstack([headColumns, elements[:startcol]])
-            intensities[i, :] = [float(x) for x in elements[startcol:]]
+    # Parse the data lines with the C tokenizer; the decimal mark and quotes are handled by pandas,
+    # and the intensity columns are parsed straight into float32
+    options = dict(sep=separator, decimal=decimal, quotechar="'", header=None, skiprows=1,
+                   engine='c', dtype={i: np.float32 for i in range(startcol, startcol + nFeatures)})
+
+    # Backing the intensities with a file only makes sense when they are written chunk by chunk
+    if memmap is not None and chunksize is None:
+        chunksize = 4096
+
+    if chunksize is None:
+        data = pd.read_csv(file, low_memory=False, **options)
+
+        # Split the heading information from the intensities in one shot
+        headColumns = data.iloc[:, :startcol].to_numpy()
+        intensities = data.iloc[:, startcol:].to_numpy(dtype=np.float32)
+    else:
+        # Count the lines first, so the output arrays can be allocated once; this is an upper bound on the
+        # number of measurements, as a quoted field may span several lines
+        with open(file, 'r') as f:
+            f.readline()
+            nMeasurements = sum(1 for line in f if line.strip())
+
+        headColumns = np.empty((nMeasurements, startcol), dtype=object)
+        if memmap is None:
+            intensities = np.empty((nMeasurements, nFeatures), dtype=np.float32)
+        else:
+            intensities = np.memmap(memmap, mode='w+', shape=(nMeasurements, nFeatures), dtype=np.float32)
+
+        # Fill the arrays chunk by chunk
+        offset = 0
+        for chunk in pd.read_csv(file, chunksize=chunksize, **options):
+            headColumns[offset:offset + len(chunk)] = chunk.iloc[:, :startcol].to_numpy()
+            intensities[offset:offset + len(chunk)] = chunk.iloc[:, startcol:].to_numpy(dtype=np.float32)
+            offset += len(chunk)
+
+        # Drop the rows that were allocated for lines which did not start a measurement
+        headColumns = headColumns[:offset]
+        intensities = intensities[:offset]
 
     if header:
-        headLabels = np.array(headLabels)
         return headLabels, headColumns, wavenumbers, intensities
     else:
         return wavenumbers, intensities
@@ -79,6 +119,110 @@ def is_float(value: str) -> bool:
     except ValueError:
         return False
 
+
+def row_stats(X: np.ndarray, block_bytes: int = 1 << 20) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the peak and the mean intensity of every spectrum in one sweep over the intensities.
+
+    Args:
+        X (np.ndarray): 2D float32 array containing intensities of the spectra; spectra in rows.
+        block_bytes (int, optional): Size of the row blocks that are reduced together; both reductions of a block
+            run while it is still in the CPU cache. Defaults to 1 MiB.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: A tuple containing:
+            - peak (np.ndarray): Maximum intensity of each spectrum.
+            - mean (np.ndarray): Mean intensity of each spectrum.
+    """
+    nMeasurements, nFeatures = X.shape
+    peak = np.empty(nMeasurements, dtype=np.float32)
+    mean = np.empty(nMeasurements, dtype=np.float32)
+
+    # Reduce the rows block by block, so each block is read from memory only once for both statistics
+    block = max(1, block_bytes // max(1, nFeatures * X.itemsize))
+    for start in range(0, nMeasurements, block):
+        rows = X[start:start + block]
+        np.max(rows, axis=1, out=peak[start:start + block])
+        np.mean(rows, axis=1, dtype=np.float32, out=mean[start:start + block])
+
+    return peak, mean
+
+
+def lod(y: np.ndarray, target: int = 2000, endpoints: bool = False) -> np.ndarray:
+    """
+    Reduces the level of detail of spectra by min/max decimation along the last axis.
+
+    Args:
+        y (np.ndarray): 1D or 2D array of values; the last axis is decimated.
+        target (int, optional): Number of buckets to keep; each bucket contributes its minimum and maximum,
+            so peaks survive the decimation. Defaults to 2000.
+        endpoints (bool, optional): If True, each bucket contributes its first and last value instead, which keeps
+            the order of an axis such as the wavenumbers, ascending or descending. Defaults to False.
+
+    Returns:
+        np.ndarray: The decimated array, or y itself if it has no more than target values.
+    """
+    n = y.shape[-1]
+    if n <= target:
+        return y
+
+    # Split the last axis into equally sized buckets and keep the extremes (or the endpoints) of each one
+    k = -(-n // target)
+    m = n // k
+    buckets = y[..., :m * k].reshape(*y.shape[:-1], m, k)
+    if endpoints:
+        pair = [buckets[..., 0], buckets[..., -1]]
+    else:
+        pair = [buckets.min(axis=-1), buckets.max(axis=-1)]
+    decimated = np.stack(pair, axis=-1).reshape(*y.shape[:-1], 2 * m)
+
+    # Treat the remaining values as a last, shorter bucket
+    if m * k < n:
+        tail = y[..., m * k:]
+        if endpoints:
+            pair = [tail[..., :1], tail[..., -1:]]
+        else:
+            pair = [tail.min(axis=-1, keepdims=True), tail.max(axis=-1, keepdims=True)]
+        decimated = np.concatenate([decimated, *pair], axis=-1)
+
+    return decimated
+
+
+def plot_spectra(wavenumbers: np.ndarray, intensities: np.ndarray, colors, labels: list[str] | None = None,
+                 linewidths=1.5, **kwargs) -> list[Line2D]:
+    """
+    Plots all spectra on the current axes as a single LineCollection instead of one line per spectrum.
+
+    Args:
+        wavenumbers (np.ndarray): Array containing the wavenumbers shared by all spectra.
+        intensities (np.ndarray): 2D array containing intensities of the spectra; spectra in rows.
+        colors: Colors of the spectra, cycled if there are fewer colors than spectra.
+        labels (list[str], optional): Legend label for each spectrum. Defaults to None.
+        linewidths (float or np.ndarray, optional): Line width, either shared or one per spectrum. Defaults to 1.5.
+        **kwargs: Additional keyword arguments passed to LineCollection.
+
+    Returns:
+        list[Line2D]: Legend handles for the labelled spectra, to be passed to plt.legend(handles=...).
+    """
+    # Decimate to roughly the figure's resolution; the full data stays untouched for the analyses
+    wavenumbers = lod(np.asarray(wavenumbers, dtype=float), endpoints=True)
+    intensities = lod(np.asarray(intensities))
+
+    # Build the (nSpectra, nFeatures, 2) segment array without a Python loop
+    segments = np.stack(np.broadcast_arrays(wavenumbers, intensities), axis=-1)
+
+    ax = plt.gca()
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=linewidths, **kwargs))
+    ax.autoscale_view()
+
+    if labels is None:
+        return []
+
+    # Proxy artists so the legend still lists every spectrum
+    linewidths = np.broadcast_to(linewidths, len(labels))
+    return [Line2D([], [], color=colors[i % len(colors)], linewidth=linewidths[i], label=label)
+            for i, label in enumerate(labels)]
+
 from google.colab import drive
 
 # Mount Google Drive to access files
@@ -90,6 +234,9 @@ experimental_csv = '/gdrive/MyDrive/assignment/Experimental_sample.csv'
 # Set the path to the media CSV file
 media_csv = '/gdrive/MyDrive/assignment/Media.csv'
 
+# Set the timestamp format of the DateTime column, so it is parsed on pandas' fast path
+datetime_format = 'ISO8601'
+
 # Read the media CSV file and extract the header labels, header columns, wavenumbers, and intensities
 header_labels_media, header_columns_media, wavenumbers_media, intensities_media = readcsv(media_csv, header=True)
 
@@ -101,17 +248,16 @@ header_labels, header_columns, wavenumbers, intensities = readcsv(experimental_c
 """
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plotting the spectra with unique colors
-for i in range(len(intensities)):
-    plt.plot(wavenumbers, intensities[i, :], color=colors[i], label=f'Spectrum {i+1}', linewidth=1)
+handles = plot_spectra(wavenumbers, intensities, colors, labels=[f'Spectrum {i+1}' for i in range(num_spectra)], linewidths=1.5)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14)
@@ -122,36 +268,39 @@ plt.grid(True, linestyle='--', alpha=0.5)
 # Adjust plot layout
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
-# Adjust the linewidth of the plotted lines
-linewidth = 1.5
-
-# Loop over the plotted lines to adjust linewidth and linestyle
-for line in plt.gca().lines:
-    line.set_linewidth(linewidth)
-    line.set_linestyle('-')
-
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 """
   Create the dataframe that includes the complete information of the data file measurement
 """
 
-# Create the first dataframe
-df1 = pd.DataFrame(header_columns, columns=header_labels)
+# Cache the intensities as one contiguous float32 array and reuse it in every analysis below
+X = np.ascontiguousarray(intensities, dtype=np.float32)
+
+# Create the dataframe on top of the intensity array, without copying it
+measurement_df = pd.DataFrame(X, columns=wavenumbers, copy=False)
 
-# Create the second dataframe
-df2 = pd.DataFrame(intensities, columns=wavenumbers)
+# Put the header columns in front of the wavenumbers, column by column, to avoid a concat of the full frame
+for i, label in enumerate(header_labels):
+    measurement_df.insert(i, label, header_columns[:, i])
 
-# Merge the dataframes into one based on the column names
-measurement_df = pd.concat([df1, df2], axis=1)
+# Convert the DateTime column once, so every analysis below works on datetime64 values
+measurement_df['DateTime'] = pd.to_datetime(measurement_df['DateTime'], format=datetime_format, cache=True)
+dt_all = measurement_df['DateTime'].to_numpy()
 
 # Display the merged dataframe
 print(measurement_df.head())
 
+waves = wavenumbers.astype(np.float32)
+
+# Calculate the peak and mean intensity of every spectrum once; the analyses below select from them
+peak_intensities, mean_intensities = row_stats(X)
+
 """
 Approach 1: To find strong and weak spectras
 The following code generates two plots. The first plot represents the distribution of peak intensities, while the second plot displays the spectra of
@@ -161,25 +310,25 @@ and to tune the threshold for the specific application.
 """
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
-# Calculate the peak intensities for each spectrum
-peak_intensities = np.max(intensities, axis=1)
+# Bin the peak intensities once; the same histogram feeds both the plot and Otsu's method
+counts, edges = np.histogram(peak_intensities, bins=256)
 
-# Plot a histogram of the peak intensities
-plt.hist(peak_intensities, bins=20, color='lightblue', edgecolor='black')
+# Plot a histogram of the peak intensities from the precomputed counts
+plt.hist(edges[:-1], bins=edges, weights=counts, color='lightblue', edgecolor='black')
 plt.xlabel('Peak Intensity', fontsize=14)
 plt.ylabel('Count', fontsize=14)
 plt.title('Distribution of Peak Intensities', fontsize=16)
 
-# Apply Otsu's method to determine the threshold
-threshold = threshold_otsu(peak_intensities)
+# Apply Otsu's method to determine the threshold, passing the histogram with its bin centers
+threshold = threshold_otsu(hist=(counts, (edges[:-1] + edges[1:]) / 2))
 
 # Relax the threshold by multiplying it with a factor
 threshold_relaxed = threshold * 0.715  # Adjust the factor as needed
@@ -192,25 +341,22 @@ plt.tight_layout()
 
 # Display the histogram plot
 plt.show()
+plt.close(fig)
+
+# Determine strong and weak spectra indexes from a single comparison against the threshold
+strong_mask = peak_intensities >= threshold_relaxed
+strong_spectra = np.flatnonzero(strong_mask)
+weak_spectra = np.flatnonzero(~strong_mask)
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Plotting the spectra with unique colors and labels
-for i in range(len(intensities)):
-    if peak_intensities[i] < threshold_relaxed:
-        label = f'Weak Spectrum {i+1}'
-        linewidth = 1
-    else:
-        label = f'Strong Spectrum {i+1}'
-        linewidth = 2
-
-    plt.plot(wavenumbers, intensities[i, :], color=colors[i], label=label, linewidth=linewidth)
+labels = [f'Weak Spectrum {i+1}' if weak else f'Strong Spectrum {i+1}' for i, weak in enumerate(~strong_mask)]
+handles = plot_spectra(wavenumbers, intensities, colors, labels=labels, linewidths=np.where(strong_mask, 2, 1))
 
 # Highlight the strong spectra
-strong_indices_relaxed = np.where(peak_intensities >= threshold_relaxed)[0]
-for idx in strong_indices_relaxed:
-    plt.plot(wavenumbers, intensities[idx, :], color='black', linewidth=3, alpha=0.8)
+plot_spectra(wavenumbers, intensities[strong_spectra], ['black'], linewidths=3, alpha=0.8)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14)
@@ -221,21 +367,11 @@ plt.title('Raman Spectra' , fontsize=16)
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
-
-# Initialize lists to store strong and weak spectra indexes
-strong_spectra = []
-weak_spectra = []
-
-# Iterate over the peak intensities and determine strong and weak spectra
-for i, intensity in enumerate(peak_intensities):
-    if intensity >= threshold_relaxed:
-        strong_spectra.append(i)
-    else:
-        weak_spectra.append(i)
+plt.close(fig)
 
 # Count the number of strong and weak spectra
 num_strong = len(strong_spectra)
@@ -245,21 +381,19 @@ num_weak = len(weak_spectra)
 print(f"Number of strong spectra in measurement file: {num_strong}")
 print(f"Number of weak spectra in measurement file: {num_weak}")
 
-wave_num = measurement_df.iloc[:, 10:].columns
+weak_spectra_measurement = measurement_df.iloc[weak_spectra].reset_index()
 
-weak_spectra_measurement = measurement_df[measurement_df.index.isin(set(weak_spectra))].reset_index()
-
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plot each spectrum
-for i in range(len(weak_spectra_measurement)):
-    plt.plot(wave_num, weak_spectra_measurement.loc[i, wave_num], color=colors[i], label=f'Weak Spectra {i+1}', linewidth=2)
+weak_intensities = X[weak_spectra]
+handles = plot_spectra(waves, weak_intensities, colors, labels=[f'Weak Spectra {i+1}' for i in range(len(weak_intensities))], linewidths=2)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14)
@@ -270,20 +404,21 @@ plt.title('Raman Spectra' , fontsize=16)
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
-strong_spectra_measurement = measurement_df[measurement_df.index.isin(set(strong_spectra))].reset_index()
+strong_spectra_measurement = measurement_df.iloc[strong_spectra].reset_index()
 
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 print(len(strong_spectra_measurement))
 
 # Plot each spectrum
-for i in range(len(strong_spectra_measurement)):
-    plt.plot(wave_num, strong_spectra_measurement.loc[i, wave_num], color=colors[i], label=f'Strong Spectra {i+1}', linewidth=2)
+strong_intensities = X[strong_spectra]
+handles = plot_spectra(waves, strong_intensities, colors, labels=[f'Strong Spectra {i+1}' for i in range(len(strong_intensities))], linewidths=2)
 
 # Set plot title and labels
 plt.title('Spectra Visualization')
@@ -299,37 +434,32 @@ plt.title('Raman Spectra' , fontsize=16)
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 """
   Analysis 2:
   Now we analyse the Temporal Distribution of the weak spectra.
 """
 
-df = measurement_df[~measurement_df.index.isin(set(strong_spectra))]
-df['DateTime'] = pd.to_datetime(df['DateTime'])
-
 # Round the timestamps to the nearest 10-minute interval
-df['dateTime_rounded'] = df['DateTime'].dt.floor('10Min')
+dateTime_rounded = pd.DatetimeIndex(dt_all[weak_spectra]).floor('10Min')
 
-# Count the number of observations for each time interval
-count_by_period = df['dateTime_rounded'].value_counts()
-
-# Sort the time intervals in ascending order
-count_by_period = count_by_period.sort_index()
+# Count the number of observations for each time interval, in ascending time order
+count_by_period = dateTime_rounded.value_counts(sort=False).sort_index()
 
 # Calculate the start and end times for each interval
 interval_start = count_by_period.index
 interval_end = interval_start + pd.Timedelta(minutes=10)
 
 # Generate x-axis labels for the bar plot
-x_labels = [f'{start.strftime("%H:%M")} - {end.strftime("%H:%M")}' for start, end in zip(interval_start, interval_end)]
+x_labels = interval_start.strftime('%H:%M') + ' - ' + interval_end.strftime('%H:%M')
 
 # Plotting the bar graph
-plt.figure(figsize=(12, 6))
+fig = plt.figure(figsize=(12, 6))
 plt.bar(x_labels, count_by_period)
 
 # Set plot title and labels
@@ -343,15 +473,16 @@ plt.xticks(rotation=45)
 # Display the plot
 plt.tight_layout()
 plt.show()
+plt.close(fig)
 
-# Convert the datetime strings to actual datetime objects
-DateTime = np.array([np.datetime64(dt) for dt in df['DateTime']])
+# Take the datetime values of the weak spectra
+DateTime = dt_all[weak_spectra]
 
 # Calculate the mean intensity for each spectrum
-mean_intensity = np.mean(df.loc[:, wave_num], axis=1)
+mean_intensity = mean_intensities[weak_spectra]
 
 # Plot the temporal distribution of the weak spectra
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 plt.plot(DateTime, mean_intensity, marker='o', markersize=5, linestyle='-', linewidth=1)
 plt.xlabel('Time', fontsize=14)
 plt.ylabel('Mean Intensity', fontsize=14)
@@ -360,6 +491,7 @@ plt.xticks(rotation=45)
 plt.grid(True)
 plt.tight_layout()
 plt.show()
+plt.close(fig)
 
 """
   Approach 2:
@@ -368,57 +500,43 @@ plt.show()
 """
 
 from scipy import stats
-wave_num = measurement_df.iloc[:, 10:].columns
 
-outlier = []
-for wave in wave_num:
-    q1 = measurement_df[wave].quantile(0.25)
-    q3 = measurement_df[wave].quantile(0.75)
-    iqr = q3 - q1
-    lower_bound = q1 - (5 * iqr) # change the multiplier from 1.5 to another value to increase the threshold for identifying outliers.
-    upper_bound = q3 + (4 * iqr)
+# Compute the quartiles of every wavenumber column in a single call
+q1, q3 = np.quantile(X, [0.25, 0.75], axis=0)
+iqr = q3 - q1
+lower_bound = q1 - (5 * iqr) # change the multiplier from 1.5 to another value to increase the threshold for identifying outliers.
+upper_bound = q3 + (4 * iqr)
 
-    if len(measurement_df[(measurement_df[wave] < lower_bound) | (measurement_df[wave] > upper_bound)]) != 0:
-        outlier.append(wave)
+is_outlier = (X < lower_bound) | (X > upper_bound)
+outlier_mask = is_outlier.any(axis=0)
+outlier = wavenumbers[outlier_mask].tolist()
 
 # Now above steps gives all the wavenumbers which are having outliers
 print("Outlier columns:", outlier)
 
 # now find rows which have these outliers in these columns (or strong spectras)
-
-strong_spectra_approach2 = []
-for col in outlier:
-    q1 = measurement_df[col].quantile(0.25)
-    q3 = measurement_df[col].quantile(0.75)
-    iqr = q3 - q1
-    lower_bound = q1 - 5* iqr
-    upper_bound = q3 + 4* iqr
-
-    # Filter the values within the lower and upper bounds
-    filtered_values = measurement_df[(measurement_df[col] <= lower_bound) | (measurement_df[col] >= upper_bound)]
-
-    # Find the index of the maximum value within the filtered values
-    max_index = filtered_values[col].index.values
-    strong_spectra_approach2.extend(max_index)
+is_strong_approach2 = is_outlier.any(axis=1)
+strong_spectra_approach2 = np.flatnonzero(is_strong_approach2)
+weak_spectra_approach2 = np.flatnonzero(~is_strong_approach2)
 
 # Find the indexes of the spectras in the dataframe measurement_df which are strong
-print(list(set(strong_spectra_approach2)))
+print(strong_spectra_approach2.tolist())
 
 #Now find all the strong spectras waveform information from the measurement dataframe and store all this information in new dataframe measurement_strong
-measurement_strong = measurement_df[measurement_df.index.isin(set(strong_spectra_approach2))].reset_index()
+measurement_strong = measurement_df.iloc[strong_spectra_approach2].reset_index()
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plot each spectrum
-for i in range(len(measurement_strong)):
-    plt.plot(wave_num, measurement_strong.loc[i, wave_num], color=colors[i], label=f'Strong peak Spectras {i+1}', linewidth=2)
+strong_intensities = X[is_strong_approach2]
+handles = plot_spectra(waves, strong_intensities, colors, labels=[f'Strong peak Spectras {i+1}' for i in range(len(strong_intensities))], linewidths=2)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14)
@@ -429,26 +547,27 @@ plt.title('Raman Spectra', fontsize=16)
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot
-plt.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+plt.legend(handles=handles, loc='center left', bbox_to_anchor=(1, 0.5))
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 #Now find all the weak spectras waveform information from the measurement dataframe and store all this information in new dataframe measurement_strong
-measurement_weak = measurement_df[~measurement_df.index.isin(set(strong_spectra_approach2))].reset_index()
+measurement_weak = measurement_df.iloc[weak_spectra_approach2].reset_index()
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plot each spectrum
-for i in range(len(measurement_weak)):
-    plt.plot(wave_num, measurement_weak.loc[i, wave_num], color=colors[i], label=f'Weak peaks Spectras {i+1}', linewidth=2)
+weak_intensities = X[~is_strong_approach2]
+handles = plot_spectra(waves, weak_intensities, colors, labels=[f'Weak peaks Spectras {i+1}' for i in range(len(weak_intensities))], linewidths=2)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14)
@@ -459,36 +578,32 @@ plt.title('Raman Spectra', fontsize=16)
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 """
   Analysis 2:
   Now we analyse the Temporal Distribution of the weak spectra.
 """
 
-measurement_weak['DateTime'] = pd.to_datetime(df['DateTime'])
-
 # Round the timestamps to the nearest 10-minute interval
-measurement_weak['dateTime_rounded'] = measurement_weak['DateTime'].dt.floor('10Min')
-
-# Count the number of observations for each time interval
-count_by_period = measurement_weak['dateTime_rounded'].value_counts()
+dateTime_rounded = pd.DatetimeIndex(dt_all[weak_spectra_approach2]).floor('10Min')
 
-# Sort the time intervals in ascending order
-count_by_period = count_by_period.sort_index()
+# Count the number of observations for each time interval, in ascending time order
+count_by_period = dateTime_rounded.value_counts(sort=False).sort_index()
 
 # Calculate the start and end times for each interval
 interval_start = count_by_period.index
 interval_end = interval_start + pd.Timedelta(minutes=10)
 
 # Generate x-axis labels for the bar plot
-x_labels = [f'{start.strftime("%H:%M")} - {end.strftime("%H:%M")}' for start, end in zip(interval_start, interval_end)]
+x_labels = interval_start.strftime('%H:%M') + ' - ' + interval_end.strftime('%H:%M')
 
 # Plotting the bar graph
-plt.figure(figsize=(12, 6))
+fig = plt.figure(figsize=(12, 6))
 plt.bar(x_labels, count_by_period)
 
 # Set plot title and labels
@@ -502,16 +617,17 @@ plt.xticks(rotation=45)
 # Display the plot
 plt.tight_layout()
 plt.show()
+plt.close(fig)
 
-# Convert the 'DateTime' column to datetime objects
-DateTime = pd.to_datetime(measurement_weak['DateTime'])
+# Take the datetime values of the weak spectra
+DateTime = dt_all[weak_spectra_approach2]
 
 # Calculate the mean intensity for each spectrum
-mean_intensity = np.mean(measurement_weak.loc[:, wave_num], axis=1)
+mean_intensity = mean_intensities[weak_spectra_approach2]
 
 
 # Plot the temporal distribution of the weak spectra
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 plt.plot(DateTime, mean_intensity, marker='o', markersize=5, linestyle='-', linewidth=1)
 plt.xlabel('Time', fontsize=14)
 plt.ylabel('Mean Intensity', fontsize=14)
@@ -520,6 +636,7 @@ plt.xticks(rotation=45)
 plt.grid(True)
 plt.tight_layout()
 plt.show()
+plt.close(fig)
 
 """
   Plotting the Spectra for all the spectrums in media file
@@ -527,20 +644,18 @@ plt.show()
 
 import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Define the number of spectra
 num_spectra = len(intensities_media)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plotting the spectra with unique colors
-for i in range(num_spectra):
-    plt.plot(wavenumbers_media, intensities_media[i, :], color=colors[i], label=f'Spectrum {i+1}', linewidth=2)
+handles = plot_spectra(wavenumbers_media, intensities_media, colors, labels=[f'Spectrum {i+1}' for i in range(num_spectra)], linewidths=1.5)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14 )
@@ -551,32 +666,26 @@ plt.grid(True, linestyle='--', alpha=0.5)
 # Adjust plot layout
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
-# Adjust the linewidth of the plotted lines
-linewidth = 1.5
-
-# Loop over the plotted lines to adjust linewidth and linestyle
-for line in plt.gca().lines:
-    line.set_linewidth(linewidth)
-    line.set_linestyle('-')
-
 # Place the legend outside the plot
-plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=10)
+plt.legend(handles=handles, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 """
   Create the dataframe that includes the complete information of the data file media
 """
 
-# Create the first dataframe
-df1_media = pd.DataFrame(header_columns_media, columns=header_labels_media)
+# Cache the media intensities as one contiguous float32 array
+X_media = np.ascontiguousarray(intensities_media, dtype=np.float32)
 
-# Create the second dataframe
-df2_media = pd.DataFrame(intensities_media, columns=wavenumbers_media)
+# Create the dataframe on top of the intensity array, without copying it
+media_df = pd.DataFrame(X_media, columns=wavenumbers_media, copy=False)
 
-# Merge the dataframes into one based on the column names
-media_df = pd.concat([df1_media, df2_media], axis=1)
+# Put the header columns in front of the wavenumbers, column by column, to avoid a concat of the full frame
+for i, label in enumerate(header_labels_media):
+    media_df.insert(i, label, header_columns_media[:, i])
 
 print(media_df.head())
 
@@ -587,37 +696,52 @@ print(media_df.head())
   does not have bacteria information in media and hence are weak spectrums in measurement file.
 """
 
+# Approach 3 compares the dataframes from their 12th column onwards; turn that column position into an offset
+# into the cached intensity arrays, so the same wavenumbers are compared whatever the number of header columns
+first_col = max(0, 11 - len(header_labels))
+first_col_media = max(0, 11 - len(header_labels_media))
+
 # Get the waveform intensities from the media dataframe
-media_intensities = media_df.iloc[:, 11:].values
+media_intensities = X_media[:, first_col_media:]
+
+# Number of decimals the intensities are rounded to before matching, so tiny float differences still match
+match_decimals = 3
+
+# Hash every rounded media spectrum by its raw bytes so each measurement row is matched with a single set lookup;
+# adding 0.0 turns -0.0 into 0.0, which would otherwise hash differently
+media_hashes = {row.tobytes() for row in np.round(media_intensities, match_decimals) + 0.0}
 
 # Create a mask for the spectras in measurement file which not match with media spectras are therefore strong spectras
-mask = np.logical_not(np.isin(measurement_df.iloc[:, 11:].values, media_intensities).all(axis=1))
+meas = X[:, first_col:]
+meas_rounded = np.round(meas, match_decimals) + 0.0
+mask = np.fromiter((row.tobytes() not in media_hashes for row in meas_rounded), dtype=bool, count=len(meas))
+strong_spectra_approach3 = np.flatnonzero(mask)
+weak_spectra_approach3 = np.flatnonzero(~mask)
 
 # Filter out the strong spectra from the measurement dataframe
-strong_filtered_measurement_df = measurement_df[mask]
+strong_filtered_measurement_df = measurement_df.iloc[strong_spectra_approach3]
 
 # Display the indexes that are not included in the filtered dataframe and are the indices for the weak spectrums
-non_matching_indexes = measurement_df[~mask].index.tolist()
+non_matching_indexes = weak_spectra_approach3.tolist()
 print("Indexes not included in filtered dataframe:", non_matching_indexes)
 
 # Now plot the specral graph for the strong spectras
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Get the wavenumbers and intensities from the filtered measurement dataframe
-wavenumbers = strong_filtered_measurement_df.columns[11:].astype(float)
-intensities = strong_filtered_measurement_df.iloc[:, 11:].values
+wavenumbers = waves[first_col:]
+intensities = meas[mask]
 
 # Define the number of spectra
 num_spectra = len(intensities)
 
-# Generate a color palette with the specified number of distinct colors
-colors = sns.color_palette('husl', num_spectra)
+# Look up the specified number of distinct colors from the hsv colormap
+colors = plt.cm.hsv(np.linspace(0, 1, num_spectra, endpoint=False))
 
 # Plotting the spectra with unique colors
-for i in range(num_spectra):
-    plt.plot(wavenumbers, intensities[i, :], color=colors[i], label=f'Strong Spectras {i+1}', linewidth=2)
+handles = plot_spectra(wavenumbers, intensities, colors, labels=[f'Strong Spectras {i+1}' for i in range(num_spectra)], linewidths=1.5)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14 )
@@ -625,36 +749,29 @@ plt.ylabel('Intensity', fontsize=14)
 plt.title('Raman Spectra', fontsize=16)
 plt.grid(True, linestyle='--', alpha=0.5)
 
-# Adjust the linewidth of the plotted lines
-linewidth = 1.5
-
-# Loop over the plotted lines to adjust linewidth and linestyle
-for line in plt.gca().lines:
-    line.set_linewidth(linewidth)
-    line.set_linestyle('-')
-
 # Adjust plot layout
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 # Now plot the specral graph for the weak spectras
 
 # Set the figure size
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
 # Get the indexes of spectra not included in the filtered dataframe
-non_matching_indexes = measurement_df[~mask].index.tolist()
+non_matching_indexes = weak_spectra_approach3.tolist()
 
 
-# Plot the spectra not included in the filtered dataframe
-for index in non_matching_indexes:
-    spectrum = measurement_df.iloc[index, 11:]
-    plt.plot(wavenumbers, spectrum, label=f'Weak Spectra {index}')
+# Plot the spectra not included in the filtered dataframe, using the default color cycle
+weak_intensities = meas[~mask]
+default_colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+handles = plot_spectra(wavenumbers, weak_intensities, default_colors, labels=[f'Weak Spectra {index}' for index in non_matching_indexes], linewidths=1.5)
 
 # Customize the plot
 plt.xlabel('Wavenumbers', fontsize=14 )
@@ -662,35 +779,28 @@ plt.ylabel('Intensity', fontsize=14)
 plt.title('Raman Spectra', fontsize=16)
 plt.grid(True, linestyle='--', alpha=0.5)
 
-# Adjust the linewidth of the plotted lines
-linewidth = 1.5
-
-# Loop over the plotted lines to adjust linewidth and linestyle
-for line in plt.gca().lines:
-    line.set_linewidth(linewidth)
-    line.set_linestyle('-')
-
 # Adjust plot layout
 plt.tight_layout(rect=[0.05, 0, 0.8, 1])
 
 # Place the legend outside the plot, starting from the same position as the plot
-plt.legend(loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
+plt.legend(handles=handles, loc='upper left', bbox_to_anchor=(1.05, 1), fontsize=10)
 
 # Display the plot
 plt.show()
+plt.close(fig)
 
 """
   Analysis 2:
   Now we analyse the Temporal Distribution of the weak spectra.
 """
 
-plt.figure(figsize=(16, 8))
+fig = plt.figure(figsize=(16, 8))
 
-# Convert the datetime strings to actual datetime objects for non-matching indexes
-non_matching_datetime = np.array([np.datetime64(dt) for dt in measurement_df.loc[non_matching_indexes, 'DateTime']])
+# Take the datetime values for non-matching indexes
+non_matching_datetime = dt_all[weak_spectra_approach3]
 
 # Calculate the mean intensity for each spectrum for non-matching indexes
-non_matching_mean_intensity = np.mean(measurement_df.loc[non_matching_indexes, wave_num], axis=1)
+non_matching_mean_intensity = mean_intensities[weak_spectra_approach3]
 
 # Calculate the total number of observations used in weak spectras
 total_observations = len(non_matching_indexes)
@@ -703,4 +813,5 @@ plt.title('Temporal Distribution of Weak Spectras', fontsize=16)
 plt.xticks(rotation=45)
 plt.grid(True)
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.show()
+plt.close(fig)
\ No newline at end of file